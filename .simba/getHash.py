@@ -7,14 +7,15 @@ def getHash(self,directory):
     if not os.path.isfile(directory+'/metadata'):
         return None
 
-    f = open(directory+"/metadata")
-    for line in f.readlines():
-        if line.startswith('#'): continue;
-        if not 'HASH = ' in line: continue
-        val = line.split(' = ')[1].replace('  ','').replace('\n','').replace(';','')
-        return val
+    # Read the file once, as raw bytes: use the recorded HASH if there is
+    # one, otherwise hash the contents as they stream past.
+    sim_hash = hashlib.sha224()
+    with open(directory+"/metadata","rb") as f:
+        for line in f:
+            sim_hash.update(line)
+            if line.startswith(b'#'): continue;
+            if not b'HASH = ' in line: continue
+            val = line.decode('utf-8').split(' = ')[1].replace('  ','').replace('\n','').replace(';','')
+            return val
 
-    f = open(directory+'/metadata')
-    sim_hash = str(hashlib.sha224(f.read().encode('utf-8')).hexdigest())
-    f.close()
-    return sim_hash        
+    return str(sim_hash.hexdigest())
@@ -1,24 +1,27 @@
 import os
 import re
 
+_metadata_line = re.compile(r'^(?!#)(.*?) = (.*)$', re.M)
+
+def parseMetadata(path):
+    """
+    Read "key = value" pairs from an alamo metadata file in a single pass.
+    Returns a list of (key, value) tuples.
+    """
+    # Match every "key = value" line in one regex pass, then drop the
+    # ones with more than one " = " and AMReX-style "key :: [values]" entries.
+    with open(path) as f:
+        text = f.read()
+    pairs = [(col, val) for col, val in _metadata_line.findall(text)
+             if ' = ' not in val and '::' not in col and '::' not in val]
+    return pairs
+
 def parseOutputDir(self,directory):
 
     if not os.path.isfile(directory+'/metadata'):
         return None
 
-    things = dict()
-
-    f = open(directory+"/metadata")
-    for line in f.readlines():
-        if line.startswith('#'): continue;
-        if '::' in line:
-            line = re.sub(r'\([^)]*\)', '',line)
-            line = line.replace(" :: ", " = ").replace('[','').replace(',','').replace(']','').replace(' ','')
-        if len(line.split(' = ')) != 2: continue;
-        col = line.split(' = ')[0]#.replace('.','_')
-        val = line.split(' = ')[1].replace('\n','')#.replace('  ','').replace('\n','').replace(';','')
-        
-        things[col] = val
+    things = dict(parseMetadata(directory+"/metadata"))
 
     if os.path.isfile(directory+"/diff.html"):
         difffile = open(directory+"/diff.html")